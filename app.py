@@ -3,6 +3,7 @@ from __future__ import annotations
 import time
 
 import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
 
@@ -35,8 +36,14 @@ fetch_btn = st.sidebar.button("Fetch trials")
 # State
 if "trials_df" not in st.session_state:
     st.session_state["trials_df"] = pd.DataFrame()
+if "trials_display" not in st.session_state:
+    st.session_state["trials_display"] = []
+if "trials_nct_index" not in st.session_state:
+    st.session_state["trials_nct_index"] = {}
 if "entities_df" not in st.session_state:
     st.session_state["entities_df"] = pd.DataFrame()
+if "ent_nct_idx" not in st.session_state:
+    st.session_state["ent_nct_idx"] = {}
 if "timing" not in st.session_state:
     st.session_state["timing"] = {}
 if "selected_nct_studies" not in st.session_state:
@@ -59,7 +66,12 @@ if fetch_btn:
         fetch_s = time.perf_counter() - t0
 
         st.session_state["trials_df"] = df_trials
+        st.session_state["trials_display"] = (
+            df_trials["nct_id"].astype(str) + " — " + df_trials["title"].astype(str).str.slice(0, 90)
+        ).tolist()
+        st.session_state["trials_nct_index"] = {nct: i for i, nct in enumerate(df_trials["nct_id"].astype(str))}
         st.session_state["entities_df"] = pd.DataFrame()
+        st.session_state["ent_nct_idx"] = {}
         st.session_state["timing"] = {"query": query, "fetch_s": float(fetch_s)}
 
         st.session_state["selected_nct_studies"] = ""
@@ -73,10 +85,16 @@ if fetch_btn:
             entities_df = run_ner_on_trials(df_trials)
             ner_s = time.perf_counter() - t1
             st.session_state["entities_df"] = entities_df
+            st.session_state["ent_nct_idx"] = (
+                entities_df.groupby(entities_df["nct_id"].astype(str), sort=False).indices
+                if not entities_df.empty
+                else {}
+            )
             st.session_state["timing"].update({"ner_s": float(ner_s), "n_entities": int(len(entities_df))})
             st.success(f"NER complete in {ner_s:.2f}s ({len(entities_df):,} mentions).")
         except Exception as e:
             st.session_state["entities_df"] = pd.DataFrame()
+            st.session_state["ent_nct_idx"] = {}
             st.session_state["timing"].pop("ner_s", None)
             st.session_state["timing"].pop("n_entities", None)
             st.error(f"NER failed: {e}")
@@ -104,6 +122,52 @@ def _clean_type_label(x: str) -> str:
     return x
 
 
+@st.cache_data(show_spinner=False, max_entries=256)
+def _annotate_cached(
+    nct_id: str,
+    text_hash: str,
+    show_tag: bool,
+    max_entities: int,
+    _text: str,
+    _doc_ents: pd.DataFrame,
+) -> str:
+    # text and entities are fully determined by (nct_id, text_hash), so they are left out of the cache key
+    return annotate_text_html(_text, _doc_ents, show_tag=show_tag, max_entities=max_entities)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cooccurrence_cached(
+    ents: pd.DataFrame,
+    left_group: str,
+    right_group: str,
+    top_left: int,
+    top_right: int,
+) -> pd.DataFrame:
+    return build_cooccurrence_long(
+        ents,
+        left_group=left_group,
+        right_group=right_group,
+        top_left=top_left,
+        top_right=top_right,
+    )
+
+
+def _entities_for_nct(nct_id: str) -> pd.DataFrame:
+    ix = st.session_state["ent_nct_idx"].get(str(nct_id), np.array([], dtype=np.int64))
+    return entities_df.iloc[ix]
+
+
+def _type_counts(label_group: pd.Series) -> pd.DataFrame:
+    counts = label_group.value_counts()
+    counts = counts[counts > 0]
+    counts = (
+        counts.groupby([_clean_type_label(str(x)) for x in counts.index], sort=False)
+        .sum()
+        .sort_values(ascending=False, kind="stable")
+    )
+    return counts.rename_axis("type").reset_index(name="mentions")
+
+
 def _heatmap_chart(df_long: pd.DataFrame, *, x_title: str, y_title: str, scheme: str) -> alt.Chart:
     
     base = (
@@ -157,18 +221,13 @@ with tab_studies:
     st.divider()
     st.subheader("Trial detail")
 
-    df_disp = df_trials.copy()
-    df_disp["_display"] = df_disp["nct_id"].astype(str) + " — " + df_disp["title"].astype(str).str.slice(0, 90)
-    options = df_disp["_display"].tolist()
+    options = st.session_state["trials_display"]
 
-    if not st.session_state["selected_nct_studies"] and len(df_disp):
-        st.session_state["selected_nct_studies"] = str(df_disp.iloc[0]["nct_id"])
+    if not st.session_state["selected_nct_studies"] and len(df_trials):
+        st.session_state["selected_nct_studies"] = str(df_trials.iloc[0]["nct_id"])
 
     def _ix_for_nct(nct: str) -> int:
-        if not nct:
-            return 0
-        m = df_disp.index[df_disp["nct_id"].astype(str) == str(nct)].tolist()
-        return int(m[0]) if m else 0
+        return st.session_state["trials_nct_index"].get(str(nct), 0)
 
     selected = st.selectbox(
         "Select a trial",
@@ -176,7 +235,7 @@ with tab_studies:
         index=_ix_for_nct(st.session_state["selected_nct_studies"]),
         key="studies_trial_selectbox",
     )
-    row = df_disp[df_disp["_display"] == selected].iloc[0]
+    row = df_trials.iloc[options.index(selected)]
     nct_id = str(row["nct_id"])
     st.session_state["selected_nct_studies"] = nct_id
 
@@ -196,8 +255,15 @@ with tab_studies:
     if entities_df is None or entities_df.empty:
         st.text_area("", value=text, height=260)
     else:
-        doc_ents = entities_df[entities_df["nct_id"].astype(str) == nct_id].copy()
-        annotated_html = annotate_text_html(text, doc_ents, show_tag=SHOW_ENTITY_TAGS, max_entities=MAX_ANNOTATED_ENTITIES)
+        doc_ents = _entities_for_nct(nct_id)
+        annotated_html = _annotate_cached(
+            nct_id,
+            str(row.get("text_hash", "") or ""),
+            SHOW_ENTITY_TAGS,
+            MAX_ANNOTATED_ENTITIES,
+            text,
+            doc_ents,
+        )
         st.markdown(annotated_html, unsafe_allow_html=True)
 
 with tab_heatmaps:
@@ -207,13 +273,8 @@ with tab_heatmaps:
         st.info("Fetch trials to run NER and generate heatmaps.")
     else:
         st.subheader("Disease × Drug")
-        dd = build_cooccurrence_long(
-            entities_df,
-            left_group="DISEASE",
-            right_group="DRUG",
-            top_left=HEATMAP_TOP_N,
-            top_right=HEATMAP_TOP_N,
-        )
+        cooc_ents = entities_df[["nct_id", "label_group", "entity_norm"]]
+        dd = _cooccurrence_cached(cooc_ents, "DISEASE", "DRUG", HEATMAP_TOP_N, HEATMAP_TOP_N)
         if dd.empty:
             st.write("No co-occurrences found.")
         else:
@@ -221,13 +282,7 @@ with tab_heatmaps:
 
         st.divider()
         st.subheader("Disease × Gene/Protein")
-        dg = build_cooccurrence_long(
-            entities_df,
-            left_group="DISEASE",
-            right_group="GENE_PROTEIN",
-            top_left=HEATMAP_TOP_N,
-            top_right=HEATMAP_TOP_N,
-        )
+        dg = _cooccurrence_cached(cooc_ents, "DISEASE", "GENE_PROTEIN", HEATMAP_TOP_N, HEATMAP_TOP_N)
         if dg.empty:
             st.write("No co-occurrences found.")
         else:
@@ -238,12 +293,10 @@ with tab_trial_nlp:
 
     st.subheader("Trial NLP")
 
-    df_disp = df_trials.copy()
-    df_disp["_display"] = df_disp["nct_id"].astype(str) + " — " + df_disp["title"].astype(str).str.slice(0, 90)
-    options = df_disp["_display"].tolist()
+    options = st.session_state["trials_display"]
 
-    if not st.session_state["selected_nct_nlp"] and len(df_disp):
-        st.session_state["selected_nct_nlp"] = str(df_disp.iloc[0]["nct_id"])
+    if not st.session_state["selected_nct_nlp"] and len(df_trials):
+        st.session_state["selected_nct_nlp"] = str(df_trials.iloc[0]["nct_id"])
 
     selected = st.selectbox(
         "Select a trial",
@@ -251,7 +304,7 @@ with tab_trial_nlp:
         index=_ix_for_nct(st.session_state["selected_nct_nlp"]),
         key="nlp_trial_selectbox",
     )
-    row = df_disp[df_disp["_display"] == selected].iloc[0]
+    row = df_trials.iloc[options.index(selected)]
     nct_id = str(row["nct_id"])
     st.session_state["selected_nct_nlp"] = nct_id
 
@@ -260,28 +313,26 @@ with tab_trial_nlp:
     if entities_df is None or entities_df.empty:
         st.text_area("", value=text, height=320)
     else:
-        df_doc = entities_df[entities_df["nct_id"].astype(str) == nct_id].copy()
+        df_doc = _entities_for_nct(nct_id)
 
         left, right = st.columns([1.7, 1.0], gap="large")
         with left:
             st.markdown("**Text**")
-            html_block = annotate_text_html(text, df_doc, show_tag=SHOW_ENTITY_TAGS, max_entities=MAX_ANNOTATED_ENTITIES)
+            html_block = _annotate_cached(
+                nct_id,
+                str(row.get("text_hash", "") or ""),
+                SHOW_ENTITY_TAGS,
+                MAX_ANNOTATED_ENTITIES,
+                text,
+                df_doc,
+            )
             st.markdown(html_block, unsafe_allow_html=True)
 
         with right:
         
             st.markdown("**Entity types**")
 
-            dist = (
-                df_doc["label_group"]
-                .fillna("UNKNOWN")
-                .astype(str)
-                .map(_clean_type_label)
-                .value_counts()
-                .reset_index()
-            )
-            dist.columns = ["type", "mentions"]
-            dist = dist[dist["mentions"] > 0]
+            dist = _type_counts(df_doc["label_group"])
 
             if dist.empty:
                 st.caption("No entities for this trial.")
@@ -299,7 +350,7 @@ with tab_trial_nlp:
                 st.altair_chart(donut.configure_view(stroke=None), use_container_width=True)
 
             st.markdown("**Entities**")
-            table = per_trial_entity_table(entities_df, nct_id=nct_id)
+            table = per_trial_entity_table(df_doc, nct_id=nct_id)
             st.dataframe(table, use_container_width=True, height=380, hide_index=True)
 
 with tab_entities:
@@ -312,14 +363,7 @@ with tab_entities:
     else:
         st.write(f"Total entity mentions: **{len(entities_df):,}**")
 
-        counts = (
-            entities_df["label_group"]
-            .fillna("UNKNOWN")
-            .astype(str)
-            .map(_clean_type_label)
-            .value_counts()
-            .reset_index()
-        )
+        counts = _type_counts(entities_df["label_group"])
         counts.columns = ["label_group", "count"]
 
         bar = (
@@ -335,7 +379,8 @@ with tab_entities:
         )
         st.altair_chart(bar.configure_view(stroke=None).configure_axis(grid=False), use_container_width=True)
 
-        df_disp = entities_df.copy()
+        # only the first 2000 rows are shown, so slice before dropping/renaming columns
+        df_disp = entities_df.head(2000)
 
         drop_cols = [c for c in ["label_raw", "score", "text_hash"] if c in df_disp.columns]
         if drop_cols:
@@ -354,7 +399,7 @@ with tab_entities:
         preferred = ["NCT Id", "Entity in the text", "Entity normalized", "Label group", "Start", "End"]
         ordered = [c for c in preferred if c in df_disp.columns] + [c for c in df_disp.columns if c not in preferred]
 
-        st.dataframe(df_disp[ordered].head(2000), use_container_width=True, hide_index=True)
+        st.dataframe(df_disp[ordered], use_container_width=True, hide_index=True)
 
 with tab_export:
     _set_active_tab("Export")
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-import hashlib
 import html
+import io
 from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
+import xxhash
 
 FIXED_COLOR_MAP: Dict[str, str] = {
     "DISEASE": "#ffe3e3",       
@@ -32,8 +34,7 @@ OTHER_PALETTE = [
 
 
 def _stable_bucket(label: str, n: int) -> int:
-    h = hashlib.md5(label.encode("utf-8", errors="ignore")).hexdigest()  # nosec B303
-    return int(h[:8], 16) % n
+    return xxhash.xxh32_intdigest(label.encode("utf-8", errors="ignore")) % n
 
 
 def _colors_for_label_group(label_group: str) -> tuple[str, str]:
@@ -59,35 +60,36 @@ def annotate_text_html(
     if entities_for_doc is None or entities_for_doc.empty:
         return f"<div style='white-space: pre-wrap;'>{html.escape(text)}</div>"
 
-    df = entities_for_doc.dropna(subset=["start", "end"]).copy()
-    df["start"] = df["start"].astype(int)
-    df["end"] = df["end"].astype(int)
-
-    df = df[(df["start"] >= 0) & (df["end"] > df["start"]) & (df["end"] <= len(text))]
-    if df.empty:
+    df = entities_for_doc.dropna(subset=["start", "end"])
+    bounds = df[["start", "end"]].to_numpy(dtype=np.int64)
+    if "label_group" in df.columns:
+        labels = df["label_group"].astype(object).fillna("").astype(str).to_numpy()
+    else:
+        labels = np.full(len(df), "", dtype=object)
+
+    valid = (bounds[:, 0] >= 0) & (bounds[:, 1] > bounds[:, 0]) & (bounds[:, 1] <= len(text))
+    bounds = bounds[valid]
+    labels = labels[valid]
+    if not len(bounds):
         return f"<div style='white-space: pre-wrap;'>{html.escape(text)}</div>"
 
-    df = df.sort_values(["start", "end"], ascending=[True, False]).head(max_entities)
+    # start ascending, end descending (longest span first on ties)
+    order = np.lexsort((-bounds[:, 1], bounds[:, 0]))[:max_entities]
+    starts = bounds[order, 0].tolist()
+    ends = bounds[order, 1].tolist()
+    labels = labels[order].tolist()
 
     spans: List[Tuple[int, int, str]] = []
     last_end = -1
-    for _, r in df.iterrows():
-        s = int(r["start"])
-        e = int(r["end"])
+    for s, e, label in zip(starts, ends, labels):
         if s < last_end:
             # overlap; skip
             continue
-        label = str(r.get("label_group", "") or "").upper()
-        spans.append((s, e, label))
+        spans.append((s, e, label.upper()))
         last_end = e
 
-    out = []
-    cursor = 0
-    for s, e, label in spans:
-        if cursor < s:
-            out.append(html.escape(text[cursor:s]))
-
-        chunk = html.escape(text[s:e])
+    fragments: Dict[str, Tuple[str, str]] = {}
+    for label in {label for _, _, label in spans}:
         bg, border = _colors_for_label_group(label)
 
         tag_html = ""
@@ -100,14 +102,28 @@ def annotate_text_html(
                 f"</span>"
             )
 
-        out.append(
+        fragments[label] = (
             f"<span style='background:{bg}; border-bottom:2px solid {border}; "
-            f"color:{TEXT_COLOR}; padding: 0px 2px; border-radius: 4px;'>"
-            f"{chunk}{tag_html}</span>"
+            f"color:{TEXT_COLOR}; padding: 0px 2px; border-radius: 4px;'>",
+            f"{tag_html}</span>",
         )
+
+    buf = io.StringIO()
+    w = buf.write
+    w("<div style='white-space: pre-wrap; line-height: 1.55;'>")
+    cursor = 0
+    for s, e, label in spans:
+        if cursor < s:
+            w(html.escape(text[cursor:s]))
+
+        open_html, close_html = fragments[label]
+        w(open_html)
+        w(html.escape(text[s:e]))
+        w(close_html)
         cursor = e
 
     if cursor < len(text):
-        out.append(html.escape(text[cursor:]))
+        w(html.escape(text[cursor:]))
+    w("</div>")
 
-    return "<div style='white-space: pre-wrap; line-height: 1.55;'>" + "".join(out) + "</div>"
\ No newline at end of file
+    return buf.getvalue()
\ No newline at end of file
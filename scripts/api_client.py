@@ -1,20 +1,31 @@
 import re
 from typing import Any, Dict, List, Optional
 
+import orjson
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 
 BASE_URL = "https://clinicaltrials.gov/api/v2/studies"
 
+RECORD_COLUMNS = [
+    "nctId",
+    "briefTitle",
+    "overallStatus",
+    "phase",
+    "studyType",
+    "sponsor",
+    "conditions",
+    "interventions",
+    "briefSummary",
+    "detailedDescription",
+]
 
-def _as_list(x) -> List[str]:
-    if x is None:
-        return []
-    if isinstance(x, list):
-        return [str(v).strip() for v in x if v is not None and str(v).strip()]
-    if isinstance(x, str):
-        return [x.strip()] if x.strip() else []
-    return [str(x).strip()] if str(x).strip() else []
+_MULTI_NEWLINE = re.compile(r"\n{3,}")
+
+# Shared session so repeated fetches reuse the keep-alive TLS connection.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
 
 
 def _get(d: Dict[str, Any], *path: str, default=None):
@@ -31,9 +42,49 @@ def _get(d: Dict[str, Any], *path: str, default=None):
 def _clean_text(s: Optional[str]) -> str:
     if not s:
         return ""
-    s = str(s).replace("\r\n", "\n").strip()
-    s = re.sub(r"\n{3,}", "\n\n", s)
-    return s
+    return _MULTI_NEWLINE.sub("\n\n", str(s).replace("\r\n", "\n").strip())
+
+
+def _study_to_record(s: Dict[str, Any]) -> Dict[str, Any]:
+    protocol = s.get("protocolSection", {}) or {}
+
+    ident = protocol.get("identificationModule", {}) or {}
+    design = protocol.get("designModule", {}) or {}
+    cond_mod = protocol.get("conditionsModule", {}) or {}
+    arms_mod = protocol.get("armsInterventionsModule", {}) or {}
+    desc_mod = protocol.get("descriptionModule", {}) or {}
+
+    phase = design.get("phases") or design.get("phase")  # phases can be list in some payloads
+    if isinstance(phase, list):
+        phase = ", ".join([str(p) for p in phase if p])
+
+    conds_raw = cond_mod.get("conditions")
+    if isinstance(conds_raw, list):
+        conditions = [c for c in (str(v).strip() for v in conds_raw if v is not None) if c]
+    elif conds_raw is not None and str(conds_raw).strip():
+        conditions = [str(conds_raw).strip()]
+    else:
+        conditions = []
+
+    interventions_raw = arms_mod.get("interventions") or []
+    interventions: List[str] = (
+        [str(it["name"]).strip() for it in interventions_raw if isinstance(it, dict) and it.get("name")]
+        if isinstance(interventions_raw, list)
+        else []
+    )
+
+    return {
+        "nctId": ident.get("nctId") or ident.get("id"),
+        "briefTitle": ident.get("briefTitle") or ident.get("officialTitle"),
+        "overallStatus": (protocol.get("statusModule", {}) or {}).get("overallStatus"),
+        "phase": phase,
+        "studyType": design.get("studyType"),
+        "sponsor": ((protocol.get("sponsorCollaboratorsModule", {}) or {}).get("leadSponsor", {}) or {}).get("name"),
+        "conditions": conditions,
+        "interventions": interventions,
+        "briefSummary": _clean_text(desc_mod.get("briefSummary")),
+        "detailedDescription": _clean_text(desc_mod.get("detailedDescription")),
+    }
 
 
 def get_clinical_trials_nlp(
@@ -49,61 +100,10 @@ def get_clinical_trials_nlp(
     if params_override:
         params.update(params_override)
 
-    resp = requests.get(BASE_URL, params=params, timeout=30)
+    resp = _SESSION.get(BASE_URL, params=params, timeout=30)
     resp.raise_for_status()
-    payload = resp.json()
-
-    records: List[Dict[str, Any]] = []
-    for s in payload.get("studies", []):
-        protocol = s.get("protocolSection", {}) or {}
-
-        ident = protocol.get("identificationModule", {}) or {}
-        status = protocol.get("statusModule", {}) or {}
-        design = protocol.get("designModule", {}) or {}
-        sponsor_mod = protocol.get("sponsorCollaboratorsModule", {}) or {}
-        cond_mod = protocol.get("conditionsModule", {}) or {}
-        arms_mod = protocol.get("armsInterventionsModule", {}) or {}
-        desc_mod = protocol.get("descriptionModule", {}) or {}
-
-        nct_id = ident.get("nctId") or ident.get("id")
-        title = ident.get("briefTitle") or ident.get("officialTitle")
-
-        overall_status = status.get("overallStatus")
-        phase = design.get("phases") or design.get("phase")  # phases can be list in some payloads
-        if isinstance(phase, list):
-            phase = ", ".join([str(p) for p in phase if p])
-
-        study_type = design.get("studyType")
-        sponsor = sponsor_mod.get("leadSponsor", {}) or {}
-        sponsor_name = sponsor.get("name")
-
-        conditions = _as_list(cond_mod.get("conditions"))
-
-        interventions_raw = arms_mod.get("interventions") or []
-        interventions: List[str] = []
-        if isinstance(interventions_raw, list):
-            for it in interventions_raw:
-                if isinstance(it, dict):
-                    name = it.get("name")
-                    if name:
-                        interventions.append(str(name).strip())
-
-        brief_summary = _clean_text(desc_mod.get("briefSummary"))
-        detailed_description = _clean_text(desc_mod.get("detailedDescription"))
-
-        records.append(
-            {
-                "nctId": nct_id,
-                "briefTitle": title,
-                "overallStatus": overall_status,
-                "phase": phase,
-                "studyType": study_type,
-                "sponsor": sponsor_name,
-                "conditions": conditions,
-                "interventions": interventions,
-                "briefSummary": brief_summary,
-                "detailedDescription": detailed_description,
-            }
-        )
-
-    return pd.DataFrame.from_records(records)
\ No newline at end of file
+    payload = orjson.loads(resp.content)
+
+    records = [_study_to_record(s) for s in payload.get("studies", [])]
+
+    return pd.DataFrame.from_records(records, columns=RECORD_COLUMNS)
\ No newline at end of file
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import hashlib
 from typing import List
 
 import pandas as pd
 import streamlit as st
+import xxhash
 
 from scripts.api_client import get_clinical_trials_nlp
 
@@ -22,7 +22,7 @@ def _safe_list(x) -> List[str]:
 
 
 def _stable_hash(text: str) -> str:
-    return hashlib.md5(text.encode("utf-8", errors="ignore")).hexdigest()  # nosec B303
+    return xxhash.xxh3_64_hexdigest(text.encode("utf-8", errors="ignore"))
 
 def fetch_trials_cached(query: str, max_results: int) -> pd.DataFrame:
     return get_clinical_trials_nlp(query_cond=query, page_size=max_results)
@@ -44,8 +44,6 @@ def normalize_trials_df(df: pd.DataFrame, include_detailed: bool) -> pd.DataFram
     if df is None or df.empty:
         return pd.DataFrame(columns=expected)
 
-    df2 = df.copy()
-
     rename_map = {
         "nctId": "nct_id",
         "briefTitle": "title",
@@ -54,14 +52,15 @@ def normalize_trials_df(df: pd.DataFrame, include_detailed: bool) -> pd.DataFram
         "briefSummary": "brief_summary",
         "detailedDescription": "detailed_description",
     }
-    df2 = df2.rename(columns={k: v for k, v in rename_map.items() if k in df2.columns})
+    # rename() returns a new frame, so the caller's df is never mutated below
+    df2 = df.rename(columns={k: v for k, v in rename_map.items() if k in df.columns})
 
     for c in expected:
         if c not in df2.columns:
             df2[c] = None
 
-    df2["conditions"] = df2["conditions"].apply(_safe_list)
-    df2["interventions"] = df2["interventions"].apply(_safe_list)
+    df2["conditions"] = [_safe_list(x) for x in df2["conditions"].tolist()]
+    df2["interventions"] = [_safe_list(x) for x in df2["interventions"].tolist()]
 
     df2["brief_summary"] = df2["brief_summary"].fillna("").astype(str)
     df2["detailed_description"] = df2["detailed_description"].fillna("").astype(str)
@@ -73,8 +72,8 @@ def normalize_trials_df(df: pd.DataFrame, include_detailed: bool) -> pd.DataFram
 
     df2["text_used"] = text_long if include_detailed else text_short
 
-    df2["text_used_trunc"] = df2["text_used"].astype(str).str.slice(0, MAX_TEXT_CHARS)
-    df2["text_hash"] = df2["text_used_trunc"].astype(str).map(_stable_hash)
+    df2["text_used_trunc"] = df2["text_used"].str.slice(0, MAX_TEXT_CHARS)
+    df2["text_hash"] = [_stable_hash(t) for t in df2["text_used_trunc"].tolist()]
 
 
     return df2
@@ -36,8 +36,7 @@ def build_cooccurrence_long(
     if entities_df is None or entities_df.empty:
         return pd.DataFrame(columns=["left", "right", "n_trials"])
 
-    df = entities_df.copy()
-    df = df[df["label_group"].isin({left_group, right_group})]
+    df = entities_df[entities_df["label_group"].isin({left_group, right_group})]
     if df.empty:
         return pd.DataFrame(columns=["left", "right", "n_trials"])
 
@@ -60,32 +59,24 @@ def build_cooccurrence_long(
     if not left_top or not right_top:
         return pd.DataFrame(columns=["left", "right", "n_trials"])
 
-    d = df[df["entity_norm"].isin(set(left_top + right_top))][["nct_id", "label_group", "entity_norm"]].dropna()
-    if d.empty:
+    d = df[["nct_id", "label_group", "entity_norm"]].dropna().drop_duplicates()
+    left = d.loc[(d["label_group"] == left_group) & d["entity_norm"].isin(left_top), ["nct_id", "entity_norm"]]
+    right = d.loc[(d["label_group"] == right_group) & d["entity_norm"].isin(right_top), ["nct_id", "entity_norm"]]
+    if left.empty or right.empty:
         return pd.DataFrame(columns=["left", "right", "n_trials"])
 
-    trials = []
-    for nct_id, g in d.groupby("nct_id"):
-        left_set = set(g.loc[g["label_group"] == left_group, "entity_norm"].unique().tolist())
-        right_set = set(g.loc[g["label_group"] == right_group, "entity_norm"].unique().tolist())
-        if not left_set or not right_set:
-            continue
-        trials.append((nct_id, left_set, right_set))
-
-    rows = []
-    for _, left_set, right_set in trials:
-        for l in left_set:
-            for r in right_set:
-                rows.append((l, r))
-
-    if not rows:
+    # one row per (trial, left, right) after the dedupe, so pair size == trial count
+    pairs = left.rename(columns={"entity_norm": "left"}).merge(
+        right.rename(columns={"entity_norm": "right"}), on="nct_id"
+    )
+    if pairs.empty:
         return pd.DataFrame(columns=["left", "right", "n_trials"])
 
     out = (
-        pd.DataFrame(rows, columns=["left", "right"])
-        .value_counts()
+        pairs.groupby(["left", "right"], sort=False)
+        .size()
         .reset_index(name="n_trials")
-        .sort_values("n_trials", ascending=False)
+        .sort_values("n_trials", ascending=False, kind="stable")
         .reset_index(drop=True)
     )
     return out
@@ -104,18 +95,15 @@ def per_trial_entity_table(
     if df.empty:
         return pd.DataFrame(columns=["label_group", "entity_text", "entity_norm", "mentions"])
 
-    surface = (
-        df.groupby(["label_group", "entity_norm"])["entity_text"]
-        .agg(lambda s: s.value_counts().index[0])
-        .reset_index()
-    )
-    counts = (
-        df.groupby(["label_group", "entity_norm"])
+    vc = (
+        df.groupby(["label_group", "entity_norm", "entity_text"], sort=False, observed=True)
         .size()
-        .reset_index(name="mentions")
-    )
-    out = counts.merge(surface, on=["label_group", "entity_norm"], how="left")
-    out = out[["label_group", "entity_text", "entity_norm", "mentions"]].sort_values(
-        ["label_group", "mentions"], ascending=[True, False]
+        .reset_index(name="c")
     )
+    by_norm = vc.groupby(["label_group", "entity_norm"], sort=False, observed=True)["c"]
+
+    # most frequent surface form per normalized entity, plus its total mentions
+    out = vc.loc[by_norm.idxmax(), ["label_group", "entity_text", "entity_norm"]]
+    out["mentions"] = by_norm.sum().to_numpy()
+    out = out.sort_values(["label_group", "mentions"], ascending=[True, False])
     return out.reset_index(drop=True)
\ No newline at end of file
@@ -1,85 +1,202 @@
 from __future__ import annotations
 
-import gc
+import concurrent.futures as cf
+import multiprocessing
+import os
 import re
-from typing import List
+from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 import spacy
+import streamlit as st
+
+NER_BATCH_SIZE = 64
+NER_MP_BATCH_SIZE = 32
+
+# Entity rows buffered in Python lists before they are flushed into a DataFrame chunk.
+ENTITY_CHUNK_ROWS = 50_000
+
+# Per-document character cap for NER; longer texts are cut at the last sentence end before it.
+NER_MAX_CHARS = 100_000
+# Inputs are truncated to NER_MAX_CHARS, so spaCy's 1M-char default is never needed.
+NER_MAX_LENGTH = 200_000
+
+# low-cardinality columns stored as categoricals (a handful of labels, one hash/id per trial)
+CATEGORY_COLUMNS = ["nct_id", "label_raw", "label_group", "text_hash"]
+
+ENTITY_COLUMNS = [
+    "nct_id",
+    "entity_text",
+    "entity_norm",
+    "label_raw",
+    "label_group",
+    "start",
+    "end",
+    "score",
+    "text_hash",
+]
+
+_WS = re.compile(r"\s+")
+_TRIM = re.compile(r"^[^\w]+|[^\w]+$")
+_DASH_TABLE = str.maketrans({"–": "-", "—": "-"})
+
+_LABEL_GROUPS = {
+    # BC5CDR
+    "DISEASE": "DISEASE",
+    "CHEMICAL": "DRUG",
+    # JNLPBA
+    "GENE_OR_GENE_PRODUCT": "GENE_PROTEIN",
+    "GENE": "GENE_PROTEIN",
+    "PROTEIN": "GENE_PROTEIN",
+}
 
 
 def _norm_entity(s: str) -> str:
     s = (s or "").strip().lower()
-    s = re.sub(r"\s+", " ", s)
-    s = s.replace("–", "-").replace("—", "-")
-    s = re.sub(r"^[^\w]+|[^\w]+$", "", s)
-    return s
+    s = _WS.sub(" ", s).translate(_DASH_TABLE)
+    return _TRIM.sub("", s)
 
 
 def _map_label_group(label: str) -> str:
     label_u = (label or "").upper()
+    return _LABEL_GROUPS.get(label_u) or label_u or "ENTITY"
 
-    # BC5CDR
-    if label_u == "DISEASE":
-        return "DISEASE"
-    if label_u == "CHEMICAL":
-        return "DRUG"
-
-    # JNLPBA
-    if label_u in {"GENE_OR_GENE_PRODUCT", "GENE", "PROTEIN"}:
-        return "GENE_PROTEIN"
-
-    return label_u or "ENTITY"
 
-
-def _doc_entities_to_records(*, nct_id: str, doc, label_source: str, text_hash: str) -> List[dict]:
-    recs: List[dict] = []
+def _doc_entity_columns(*, doc, text: str, label_source: str) -> Dict[str, list]:
+    cols: Dict[str, list] = {c: [] for c in ("entity_text", "entity_norm", "label_raw", "label_group", "start", "end")}
     for ent in doc.ents:
-        entity_text = ent.text.strip()
-        if not entity_text:
+        s, e = ent.start_char, ent.end_char
+        entity_text = text[s:e].strip()
+        entity_norm = _norm_entity(entity_text)
+        if len(entity_norm) < 2:
             continue
         label_raw = ent.label_
-        recs.append(
-            {
-                "nct_id": nct_id,
-                "entity_text": entity_text,
-                "entity_norm": _norm_entity(entity_text),
-                "label_raw": f"{label_source}:{label_raw}",
-                "label_group": _map_label_group(label_raw),
-                "start": int(ent.start_char),
-                "end": int(ent.end_char),
-                "score": None,
-                "text_hash": text_hash,
-            }
-        )
-    return recs
+        cols["entity_text"].append(entity_text)
+        cols["entity_norm"].append(entity_norm)
+        cols["label_raw"].append(f"{label_source}:{label_raw}")
+        cols["label_group"].append(_map_label_group(label_raw))
+        cols["start"].append(s)
+        cols["end"].append(e)
+    return cols
 
 
 def _dedupe_entities(entities_df: pd.DataFrame) -> pd.DataFrame:
     if entities_df is None or entities_df.empty:
         return entities_df
     key_cols = ["nct_id", "start", "end", "label_group", "entity_norm"]
-    return entities_df.drop_duplicates(subset=key_cols).reset_index(drop=True)
+    # one uint64 row hash over the key columns instead of a five-column composite comparison
+    row_keys = pd.util.hash_pandas_object(entities_df[key_cols], index=False)
+    return entities_df[~row_keys.duplicated().to_numpy()].reset_index(drop=True)
+
+
+def _truncate_for_ner(text: str) -> str:
+    if len(text) <= NER_MAX_CHARS:
+        return text
+    cut = text.rfind(". ", 0, NER_MAX_CHARS)
+    return text[: cut + 1] if cut > 0 else text[:NER_MAX_CHARS]
+
+
+def _ner_inputs(trials_df: pd.DataFrame, text_col: str, text_hash_col: str) -> pd.DataFrame:
+    nct_ids = trials_df["nct_id"].fillna("").astype(str)
+    texts = trials_df[text_col].fillna("").astype(str)
+    text_hashes = trials_df.get(text_hash_col)
+    if text_hashes is None:
+        text_hashes = pd.Series("", index=trials_df.index)
+    mask = (nct_ids.str.len() > 0) & (texts.str.strip().str.len() > 0)
+    too_long = texts.str.len() > NER_MAX_CHARS
+    if too_long.any():
+        # prefix cut, so entity offsets still index into the original text
+        texts = texts.where(~too_long, texts[too_long].map(_truncate_for_ner))
+    return pd.DataFrame(
+        {
+            "nct_id": nct_ids[mask],
+            "text": texts[mask],
+            "text_hash": text_hashes[mask].fillna("").astype(str),
+        }
+    )
+
+
+class _EntityBuffer:
+    """Column-wise entity accumulator that flushes to a DataFrame every ENTITY_CHUNK_ROWS rows."""
+
+    def __init__(self) -> None:
+        self.frames: List[pd.DataFrame] = []
+        self.columns: Dict[str, list] = {c: [] for c in ENTITY_COLUMNS}
+
+    def add(self, *, nct_id: str, text_hash: str, doc_cols: Dict[str, list]) -> None:
+        n = len(doc_cols["start"])
+        if not n:
+            return
+        for c, vals in doc_cols.items():
+            self.columns[c].extend(vals)
+        self.columns["nct_id"].extend([nct_id] * n)
+        self.columns["score"].extend([None] * n)
+        self.columns["text_hash"].extend([text_hash] * n)
+        if len(self.columns["start"]) >= ENTITY_CHUNK_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        data = dict(self.columns)
+        for c in ("start", "end"):
+            data[c] = np.fromiter(data[c], dtype=np.int32, count=len(data[c]))
+        self.frames.append(pd.DataFrame(data))
+        self.columns = {c: [] for c in ENTITY_COLUMNS}
+
+    def to_frame(self) -> pd.DataFrame:
+        if self.columns["start"] or not self.frames:
+            self._flush()
+        if len(self.frames) == 1:
+            return self.frames[0]
+        return pd.concat(self.frames, ignore_index=True, copy=False)
+
+
+def _trials_by_text(inputs: pd.DataFrame) -> Dict[str, List[Tuple[str, str]]]:
+    # Each distinct text is tagged once and its entities are added for every trial sharing it.
+    # Keyed on the text itself: the hash column is caller-supplied and may be blank or missing.
+    trials: Dict[str, List[Tuple[str, str]]] = {}
+    for nct_id, text, text_hash in zip(inputs["nct_id"].tolist(), inputs["text"].tolist(), inputs["text_hash"].tolist()):
+        trials.setdefault(text, []).append((nct_id, text_hash))
+    return trials
+
+
+def _n_process(n_texts: int) -> int:
+    # Only with fork: spawn (Windows, macOS) would pickle both cached pipelines into every worker.
+    # Worker start-up only pays off past a couple of batches.
+    if multiprocessing.get_start_method() != "fork" or n_texts <= 2 * NER_MP_BATCH_SIZE:
+        return 1
+    return max(1, (os.cpu_count() or 1) - 1)
 
 
 def _run_one_model(
     *,
-    trials_df: pd.DataFrame,
+    trials: Dict[str, List[Tuple[str, str]]],
     nlp,
     label_source: str,
-    text_col: str,
-    text_hash_col: str,
-) -> List[dict]:
-    records: List[dict] = []
-    for _, row in trials_df.iterrows():
-        nct_id = str(row.get("nct_id", "") or "")
-        text = str(row.get(text_col, "") or "")
-        text_hash = str(row.get(text_hash_col, "") or "")
-        if not nct_id or not text.strip():
-            continue
-        doc = nlp(text)
-        records.extend(_doc_entities_to_records(nct_id=nct_id, doc=doc, label_source=label_source, text_hash=text_hash))
-    return records
+    entities: _EntityBuffer,
+) -> None:
+    texts = list(trials)
+    n_process = _n_process(len(texts))
+    batch_size = NER_BATCH_SIZE if n_process == 1 else NER_MP_BATCH_SIZE
+
+    # nlp.pipe yields docs in input order, also with n_process > 1. Each doc's entities go straight
+    # into the buffer, so only one document's columns are held outside it at a time.
+    for text, doc in zip(texts, nlp.pipe(texts, batch_size=batch_size, n_process=n_process)):
+        doc_cols = _doc_entity_columns(doc=doc, text=text, label_source=label_source)
+        for nct_id, text_hash in trials[text]:
+            entities.add(nct_id=nct_id, text_hash=text_hash, doc_cols=doc_cols)
+
+
+@st.cache_resource(show_spinner=False)
+def _load_ner_model(name: str, label_source: str):
+    nlp = spacy.load(
+        name,
+        exclude=["tagger", "parser", "lemmatizer", "attribute_ruler"],
+    )
+    if "ner" not in nlp.pipe_names:
+        raise RuntimeError(f"{label_source} model loaded but has no 'ner' component.")
+    nlp.max_length = NER_MAX_LENGTH
+    return nlp
 
 
 def run_ner_on_trials(
@@ -88,61 +205,31 @@ def run_ner_on_trials(
     text_hash_col: str = "text_hash",
 ) -> pd.DataFrame:
     """
-    In order to run the live demo on Streamlit Cloud:
-    - Load BC5CDR, run it, then delete it + gc.
-    - Load JNLPBA, run it, then delete it + gc.
-    This keeps peak memory lower by not holding both models simultaneously.
+    Runs BC5CDR (diseases, chemicals) and then JNLPBA (genes/proteins, ...) over the trial texts.
+    Both pipelines are loaded once per process through st.cache_resource, so reruns and later
+    fetches skip spacy.load; the trade-off is that both models stay resident after the first run.
     """
     if trials_df is None or trials_df.empty:
         return pd.DataFrame()
 
-    records: List[dict] = []
+    inputs = _ner_inputs(trials_df, text_col, text_hash_col)
+    if inputs.empty:
+        return pd.DataFrame()
 
-    nlp_bc5cdr = spacy.load(
-        "en_ner_bc5cdr_md",
-        exclude=["tagger", "parser", "lemmatizer", "attribute_ruler"],
-    )
-    if "ner" not in nlp_bc5cdr.pipe_names:
-        raise RuntimeError("BC5CDR model loaded but has no 'ner' component.")
-
-    try:
-        records.extend(
-            _run_one_model(
-                trials_df=trials_df,
-                nlp=nlp_bc5cdr,
-                label_source="BC5CDR",
-                text_col=text_col,
-                text_hash_col=text_hash_col,
-            )
-        )
-    finally:
-        del nlp_bc5cdr
-        gc.collect()
-
-    nlp_jnlpba = spacy.load(
-        "en_ner_jnlpba_md",
-        exclude=["tagger", "parser", "lemmatizer", "attribute_ruler"],
-    )
-    if "ner" not in nlp_jnlpba.pipe_names:
-        raise RuntimeError("JNLPBA model loaded but has no 'ner' component.")
-
-    try:
-        records.extend(
-            _run_one_model(
-                trials_df=trials_df,
-                nlp=nlp_jnlpba,
-                label_source="JNLPBA",
-                text_col=text_col,
-                text_hash_col=text_hash_col,
-            )
-        )
-    finally:
-        del nlp_jnlpba
-        gc.collect()
-
-    entities_df = pd.DataFrame.from_records(records)
-    if not entities_df.empty:
-        entities_df = entities_df[entities_df["entity_norm"].astype(str).str.len() >= 2].reset_index(drop=True)
-
-    return _dedupe_entities(entities_df)
+    trials = _trials_by_text(inputs)
+    entities = _EntityBuffer()
+
+    # Load JNLPBA in the background while BC5CDR loads and runs. Skipped when the BC5CDR pass
+    # forks worker processes, since forking while another thread is inside spacy.load is unsafe.
+    preload = _n_process(len(trials)) == 1
+    with cf.ThreadPoolExecutor(max_workers=1) as pool:
+        if preload:
+            jnlpba_future = pool.submit(_load_ner_model, "en_ner_jnlpba_md", "JNLPBA")
+        nlp_bc5cdr = _load_ner_model("en_ner_bc5cdr_md", "BC5CDR")
+        _run_one_model(trials=trials, nlp=nlp_bc5cdr, label_source="BC5CDR", entities=entities)
+        nlp_jnlpba = jnlpba_future.result() if preload else _load_ner_model("en_ner_jnlpba_md", "JNLPBA")
+
+    _run_one_model(trials=trials, nlp=nlp_jnlpba, label_source="JNLPBA", entities=entities)
 
+    entities_df = entities.to_frame().astype({c: "category" for c in CATEGORY_COLUMNS})
+    return _dedupe_entities(entities_df)
\ No newline at end of file